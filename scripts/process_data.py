@@ -4,6 +4,10 @@ from src.data.metrics import WalletMetricsCalculator
 import logging
 from pathlib import Path
 
+# Stage log file and format, also used by WhaleWatcher when it runs this stage in-process
+LOG_FILE = 'logs/processing.log'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
 
 def setup_logging():
     
@@ -11,28 +15,33 @@ def setup_logging():
     logs_dir = Path('logs')
     logs_dir.mkdir(exist_ok=True)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('logs/processing.log'),
-            logging.StreamHandler()
-        ]
-    )
+    # Already configured when WhaleWatcher runs this stage in-process; it attaches LOG_FILE itself
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            format=LOG_FORMAT,
+            handlers=[
+                logging.FileHandler(LOG_FILE),
+                logging.StreamHandler()
+            ]
+        )
 
-def main():
+def main(raw_frames=None):
     setup_logging()
     logger = logging.getLogger(__name__)
     
     try:
         processor = DataProcessor()
-        processor.process_all_wallets()
+        # Raw frames handed over by an in-process collection run skip the raw file reads
+        # (each is still pickled to a processing worker)
+        processed_frames = processor.process_all_wallets(raw_frames)
         logger.info("Processing complete")
 
-        # Calculate metrics
+        # Calculate metrics from the frames just processed rather than re-reading their files
+        # (each is still pickled to a metrics worker)
         logger.info("Starting wallets metrics calculation...")
         metrics_calculator = WalletMetricsCalculator()
-        metrics_calculator.process_all_wallets()
+        metrics_calculator.process_all_wallets(processed_frames)
         logger.info("Wallet metrics calculation complete")
         
     except Exception as e:
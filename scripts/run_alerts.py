@@ -4,6 +4,10 @@ import logging
 from src.analysis.whale_alerts import WhaleAlertMonitor
 from pathlib import Path
 
+# Stage log file and format, also used by WhaleWatcher when it runs this stage in-process
+LOG_FILE = 'logs/alerts.log'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
 def setup_logging():
     """Setup logging configuration"""
 
@@ -11,24 +15,26 @@ def setup_logging():
     logs_dir = Path('logs')
     logs_dir.mkdir(exist_ok=True)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('logs/alerts.log'),
-            logging.StreamHandler()
-        ]
-    )
+    # Already configured when WhaleWatcher runs this stage in-process; it attaches LOG_FILE itself
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            format=LOG_FORMAT,
+            handlers=[
+                logging.FileHandler(LOG_FILE),
+                logging.StreamHandler()
+            ]
+        )
     return logging.getLogger(__name__)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Run whale alert monitoring system")
     parser.add_argument('--hours', type=int, default=24,
                       help='Number of hours to look back for alerts (default: 24)')
     parser.add_argument('--no-alert', action='store_true',
                       help='Run without sending actual alerts')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     logger = setup_logging()
     
     logger.info(f"Starting alert monitoring for past {args.hours} hours")
@@ -8,7 +8,16 @@ sys.path.insert(0, str(project_root))
 from src.data.collector import WhaleDataCollector
 from src.data.BTC_price_collector import BTCPriceCollector
 from src.data.storage import DataStorage
+from src.data.processor import DataProcessor
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Wallet fetches are network-bound, so threads overlap the request latency
+COLLECTION_WORKERS = 16
+
+# Stage log file and format, also used by WhaleWatcher when it runs this stage in-process
+LOG_FILE = 'logs/whale_tracker.log'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
 
 def setup_logging():
@@ -17,18 +26,21 @@ def setup_logging():
     logs_dir = Path('logs')
     logs_dir.mkdir(exist_ok=True)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('logs/whale_tracker.log'),
-            logging.StreamHandler()
-        ]
-    )
+    # Already configured when WhaleWatcher runs this stage in-process; it attaches LOG_FILE itself
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            format=LOG_FORMAT,
+            handlers=[
+                logging.FileHandler(LOG_FILE),
+                logging.StreamHandler()
+            ]
+        )
 
 def main():
     setup_logging()
     logger = logging.getLogger(__name__)
+    collected_frames = {}
     
     try:
         # Update BTC USD price data appending on bitfenix file
@@ -43,18 +55,30 @@ def main():
         richlist_df = collector.get_richlist_wallets(pages=1)
         storage.save_richlist(richlist_df)
         
-        # Collect transaction data for each wallet
-        for address in richlist_df['btc_address']:
-            try:
-                transactions_df = collector.get_wallet_transactions(address)
-                if not transactions_df.empty:
-                    storage.save_wallet_transactions(address, transactions_df)
-            except Exception as e:
-                logger.error(f"Error processing wallet {address}: {e}")
-                continue
+        # Collect transaction data for each wallet concurrently, saving from the main thread
+        with ThreadPoolExecutor(max_workers=COLLECTION_WORKERS) as executor:
+            futures = {
+                executor.submit(collector.get_wallet_transactions, address): address
+                for address in richlist_df['btc_address']
+            }
+            for future in as_completed(futures):
+                address = futures[future]
+                try:
+                    transactions_df = future.result()
+                    if not transactions_df.empty:
+                        storage.save_wallet_transactions(address, transactions_df)
+                        # Keep only the fields the processor reads, for an in-process handoff
+                        collected_frames[address] = transactions_df[
+                            [c for c in DataProcessor.RAW_COLUMNS if c in transactions_df.columns]
+                        ]
+                except Exception as e:
+                    logger.error(f"Error processing wallet {address}: {e}")
+                    continue
                 
     except Exception as e:
         logger.error(f"Error in data collection: {str(e)}")
+    
+    return collected_frames
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,15 +1,49 @@
 import sys; print("DEBUG: WHALE_ALERTS.PY - File loaded", file=sys.stderr)
 
 import pandas as pd
+import numpy as np
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import logging
-import socket
+import time
+from collections import deque
+from functools import lru_cache
 from src.config.credentials import TELEGRAM_TOKEN, TELEGRAM_CHAT_ID
 
 
+@lru_cache(maxsize=4)
+def _read_stats(stats_file: str, mtime: float) -> pd.DataFrame:
+    """Read the wallet summary once per file version (mtime is part of the key); treat as read-only"""
+    read = pd.read_parquet if stats_file.endswith('.parquet') else pd.read_csv
+    return read(stats_file).set_index('wallet_address', drop=False)
+
+
 class WhaleAlertMonitor:
+    # Processed transaction columns needed to classify and format alerts
+    TRANSACTION_COLUMNS = ['wallet_address', 'timestamp', 'amount_btc', 'portfolio_pct']
+
+    # Telegram caps messages at 4096 characters; leave room for the HTML wrapper
+    MAX_MESSAGE_LENGTH = 4000
+    ALERT_SEPARATOR = "\n---\n"
+
+    # Telegram allows about 30 messages per second per bot
+    RATE_LIMIT_MESSAGES = 30
+    RATE_LIMIT_WINDOW = 1.0
+
+    # Seconds to wait on Telegram before giving up on a send
+    REQUEST_TIMEOUT = 10
+
+    # Parquet decoding releases the GIL, so a few threads overlap file reads
+    READ_WORKERS = 8
+
+    # Ascending portfolio_pct thresholds and the alert level for each bucket they define
+    _THRESH = np.array([0.2, 5, 10])
+    _LABELS = np.array([None, "ℹ️ INFO", "⚠️ HIGH", "🚨 URGENT"], dtype=object)
+
     def __init__(self, base_dir="data", alert_enabled=True):
         self.base_dir = Path(base_dir)
         self.alert_enabled = alert_enabled
@@ -17,8 +51,31 @@ class WhaleAlertMonitor:
         self.chat_id = TELEGRAM_CHAT_ID
         self.logger = logging.getLogger(__name__)
         
+        # Keep-alive session so repeated sends skip the DNS+TLS handshake. sendMessage is a POST and
+        # a read error or 5xx can follow a delivered message, so only retry failed connects and
+        # 429 rate limiting (honouring Retry-After), where Telegram has not accepted the message
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=3,
+                connect=3,
+                read=0,
+                other=0,
+                backoff_factor=0.5,
+                status_forcelist=[429],
+                allowed_methods=frozenset({'POST'}),
+                respect_retry_after_header=True
+            )
+        ))
+        # Monotonic times of the sends inside the current rate-limit window
+        self._send_times = deque()
+        
         # Load wallet stats for context
         self.wallet_stats = self._load_wallet_stats()
+        # Per-wallet stats as plain dicts so per-alert lookups are a hash probe
+        self._stats_by_addr = self.wallet_stats.to_dict('index')
     
     def telegram_noti(self, text: str):
         """Your existing telegram notification function"""
@@ -33,15 +90,56 @@ class WhaleAlertMonitor:
             'text': msg,
             'parse_mode': 'HTML'
         }
-        requests.post(f"https://api.telegram.org/bot{self.token_id}/sendMessage", data=payload)
+        self._wait_for_send_slot()
+        response = self._session.post(
+            f"https://api.telegram.org/bot{self.token_id}/sendMessage", data=payload, timeout=self.REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+    
+    def _wait_for_send_slot(self):
+        """Block until another message fits in the Telegram rate limit, then record the send"""
+        now = time.monotonic()
+        while self._send_times and now - self._send_times[0] >= self.RATE_LIMIT_WINDOW:
+            self._send_times.popleft()
+        
+        if len(self._send_times) >= self.RATE_LIMIT_MESSAGES:
+            # Sleep until the oldest send ages out of the window
+            time.sleep(self.RATE_LIMIT_WINDOW - (now - self._send_times.popleft()))
+            now = time.monotonic()
+        
+        self._send_times.append(now)
+    
+    def send_alerts(self, messages):
+        """Send alert messages coalesced into as few Telegram messages as fit the size limit"""
+        batch = ""
+        for message in messages:
+            candidate = f"{batch}{self.ALERT_SEPARATOR}{message}" if batch else message
+            if batch and len(candidate) > self.MAX_MESSAGE_LENGTH:
+                self._send_batch(batch)
+                batch = message
+            else:
+                batch = candidate
+        
+        if batch:
+            self._send_batch(batch)
+    
+    def _send_batch(self, batch):
+        """Send one coalesced message, logging a failed send so later batches still go out"""
+        try:
+            self.telegram_noti(batch)
+        except requests.RequestException as e:
+            self.logger.error(f"Error sending Telegram alert: {str(e)}")
     
     def _load_wallet_stats(self):
         """Load wallet performance stats"""
-        stats_file = self.base_dir / "processed" / "wallet_metrics" / "all_wallets_summary.csv"
+        stats_file = self.base_dir / "processed" / "wallet_metrics" / "all_wallets_summary.parquet"
+        if not stats_file.exists():
+            # Summary written before the switch to parquet storage
+            stats_file = stats_file.with_suffix('.csv')
         self.logger.info(f"Looking for wallet stats at: {stats_file}")
         
         if stats_file.exists():
-            df = pd.read_csv(stats_file)
+            df = _read_stats(str(stats_file), stats_file.stat().st_mtime)
             self.logger.info(f"Found stats file with {len(df)} wallets")
             return df
         
@@ -50,15 +148,22 @@ class WhaleAlertMonitor:
     
     def is_notable_transaction(self, transaction, wallet_stats=None):
         """Determine if transaction needs alert"""
-        portfolio_pct = transaction['portfolio_pct']
-        
-        if portfolio_pct >= 10:
-            return "🚨 URGENT"
-        elif portfolio_pct >= 5:
-            return "⚠️ HIGH"
-        elif portfolio_pct >= 0.2:
-            return "ℹ️ INFO"
-        return None
+        return self._alert_levels(transaction['portfolio_pct'])
+    
+    def _alert_levels(self, portfolio_pct):
+        """Map portfolio percentages (scalar or array) to alert levels, None when not notable"""
+        pct = np.asarray(portfolio_pct, dtype=float)
+        buckets = np.searchsorted(self._THRESH, pct, side='right')
+        # NaN sorts past every threshold, but a missing percentage never alerts
+        return self._LABELS[np.where(np.isnan(pct), 0, buckets)]
+
+    def _read_transactions(self, trans_file):
+        """Read the alert columns of one processed transaction file, None on failure"""
+        try:
+            return pd.read_parquet(trans_file, columns=self.TRANSACTION_COLUMNS)
+        except Exception as e:
+            self.logger.error(f"Error reading file {trans_file.name}: {str(e)}")
+            return None
 
     def check_timeframe(self, hours=24):
         """Alert on transactions in last X hours"""
@@ -70,51 +175,65 @@ class WhaleAlertMonitor:
         trans_dir = self.base_dir / "processed" / "transactions"
         self.logger.info(f"Checking transactions in: {trans_dir}")
         
-        for trans_file in trans_dir.glob("*.csv"):
+        # Files untouched since the cutoff cannot hold recent transactions, so skip them unopened
+        cutoff_ts = cutoff.timestamp()
+        all_files = list(trans_dir.glob("*.parquet"))
+        trans_files = [f for f in all_files if f.stat().st_mtime >= cutoff_ts]
+        
+        if all_files and not trans_files:
+            self.logger.info(f"No transaction files modified since {cutoff} in {trans_dir}")
+            return
+        
+        # Read every wallet file once and filter the combined frame in a single pass
+        with ThreadPoolExecutor(max_workers=self.READ_WORKERS) as executor:
+            frames = [df for df in executor.map(self._read_transactions, trans_files)
+                      if df is not None]
+        
+        if not frames:
+            self.logger.warning(f"No transaction files found in {trans_dir}")
+            return
+        
+        df = pd.concat(frames, ignore_index=True)
+        recent_txs = df[df['timestamp'] >= cutoff]
+        
+        for wallet_address, count in recent_txs.groupby('wallet_address', sort=False, observed=True).size().items():
+            self.logger.info(f"Found {count} recent transactions for {wallet_address}")
+        
+        # Classify all recent transactions in one vectorized pass
+        alert_levels = self._alert_levels(recent_txs['portfolio_pct'])
+        notable = pd.notna(alert_levels)
+        
+        messages = []
+        has_stats = bool(self._stats_by_addr)
+        for tx, alert_level in zip(recent_txs[notable].itertuples(index=False), alert_levels[notable]):
             try:
-                df = pd.read_csv(trans_file)
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                
-                # Filter recent transactions
-                recent_txs = df[df['timestamp'] >= cutoff]
+                # Get wallet stats if available
+                wallet_stats = self._stats_by_addr.get(tx.wallet_address)
+                if wallet_stats is not None:
+                    self.logger.info(f"Found stats for wallet {tx.wallet_address}")
+                elif has_stats:
+                    self.logger.warning(f"No stats found for wallet {tx.wallet_address}")
                 
-                if not recent_txs.empty:
-                    self.logger.info(f"Found {len(recent_txs)} recent transactions in {trans_file.name}")
+                # Format message
+                messages.append(self.format_alert(tx, wallet_stats, alert_level))
                 
-                for _, tx in recent_txs.iterrows():
-                    alert_level = self.is_notable_transaction(tx)
-                    if alert_level:
-                        # Get wallet stats if available
-                        wallet_stats = None
-                        if not self.wallet_stats.empty:
-                            matching_stats = self.wallet_stats[
-                                self.wallet_stats['wallet_address'] == tx['wallet_address']
-                            ]
-                            if not matching_stats.empty:
-                                wallet_stats = matching_stats.iloc[0]
-                                self.logger.info(f"Found stats for wallet {tx['wallet_address']}")
-                            else:
-                                self.logger.warning(f"No stats found for wallet {tx['wallet_address']}")
-                        
-                        # Format message
-                        message = self.format_alert(tx, wallet_stats, alert_level)
-                        self.telegram_noti(message)
-                        
             except Exception as e:
-                self.logger.error(f"Error processing file {trans_file.name}: {str(e)}")
+                self.logger.error(f"Error alerting on transaction for {tx.wallet_address}: {str(e)}")
                 continue
+        
+        self.send_alerts(messages)
     
     def format_alert(self, transaction, wallet_stats, alert_level):
         """Format alert message with wallet context"""
-        action = "Bought" if transaction['amount_btc'] > 0 else "Sold"
-        amount = abs(transaction['amount_btc'])
+        action = "Bought" if transaction.amount_btc > 0 else "Sold"
+        amount = abs(transaction.amount_btc)
         
         # Base alert message
         msg = (
             f"{alert_level}\n"
-            f"Wallet: {transaction['wallet_address']}\n"
+            f"Wallet: {transaction.wallet_address}\n"
             f"Action: {action} {amount:.2f} BTC\n"
-            f"Portfolio: {transaction['portfolio_pct']:.1f}%\n"
+            f"Portfolio: {transaction.portfolio_pct:.1f}%\n"
         )
         
         # Add wallet context if stats are available
@@ -1,33 +1,112 @@
 from pathlib import Path
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 import logging
 import time
+import json
+import io
+from functools import lru_cache
+
+@lru_cache(maxsize=4)
+def _read_price_history(price_file: str, mtime_ns: int) -> pd.DataFrame:
+    """Parse one version of the price CSV, via its parquet mirror when that is up to date"""
+    logger = logging.getLogger(__name__)
+    price_path = Path(price_file)
+    mirror_path = price_path.with_suffix('.parquet')
+    
+    try:
+        if mirror_path.exists() and mirror_path.stat().st_mtime_ns >= mtime_ns:
+            return pd.read_parquet(mirror_path)
+    except Exception as e:
+        logger.warning(f"Could not read price mirror {mirror_path}, parsing CSV instead: {str(e)}")
+    
+    # Parse straight into Arrow columns; Price is read as text so the thousands separators
+    # are stripped in Arrow before a single numeric cast
+    table = pacsv.read_csv(price_path, convert_options=pacsv.ConvertOptions(
+        include_columns=['Date', 'Price'],
+        column_types={'Date': pa.timestamp('ns'), 'Price': pa.string()},
+        strings_can_be_null=True
+    ))
+    prices = pc.replace_substring(table['Price'], ',', '')
+    try:
+        prices = pc.cast(prices, pa.float64())
+    except pa.ArrowInvalid:
+        # Non-numeric entries become NaN, as before
+        prices = pd.to_numeric(prices.to_pandas(), errors='coerce')
+    df = pd.DataFrame({'Date': table['Date'].to_pandas(), 'Price': prices})
+    
+    # Mirror the parsed frame so later cold starts skip the CSV parse
+    try:
+        tmp_path = mirror_path.with_suffix('.parquet.tmp')
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd', index=False)
+        tmp_path.replace(mirror_path)
+    except Exception as e:
+        logger.warning(f"Could not write price mirror {mirror_path}: {str(e)}")
+    
+    return df
+
+
+def load_price_history(price_file: Path) -> pd.DataFrame:
+    """Date/Price history from the price CSV, cached per file version; treat as read-only"""
+    return _read_price_history(str(price_file), price_file.stat().st_mtime_ns)
+
+
+def read_last_price_row(price_file: Path) -> pd.DataFrame:
+    """Parse only the header and the last data row of the price CSV"""
+    with open(price_file, 'rb') as f:
+        header = f.readline()
+        # Walk back from the end in small blocks until the last full line is in view
+        f.seek(0, 2)
+        block = b''
+        pos = f.tell()
+        while pos > len(header) and block.rstrip(b'\r\n').count(b'\n') < 1:
+            step = min(4096, pos - len(header))
+            pos -= step
+            f.seek(pos)
+            block = f.read(step) + block
+    
+    last_line = block.rstrip(b'\r\n').rsplit(b'\n', 1)[-1]
+    df = pd.read_csv(io.BytesIO(header + last_line + b'\n'), parse_dates=['Date'], date_format='%Y-%m-%d')
+    # Convert Price to numeric, removing any commas
+    df['Price'] = pd.to_numeric(df['Price'].astype(str).str.replace(',', ''), errors='coerce')
+    return df
+
 
 class BTCPriceCollector:
     def __init__(self, base_dir: str = "data"):
         self.base_dir = Path(base_dir)
         self.logger = logging.getLogger(__name__)
         self.price_file = self.base_dir / "raw" / "price" / "BTC_USD_Bitfinex_Investing_com.csv"
+        self.latest_price_file = self.price_file.parent / "latest_price.json"
+        
+        # Pooled session that backs off and retries CoinGecko rate limits and transient errors
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        ))
         
     def update_price_data(self):
         """Update BTC-USD price data using CoinGecko API"""
         try:
             self.logger.info("Starting price data update process")
             
-            # Load existing data if available
-            if self.price_file.exists():
-                self.logger.debug(f"Loading existing price file: {self.price_file}")
-                existing_df = pd.read_csv(self.price_file)
-                existing_df['Date'] = pd.to_datetime(existing_df['Date'])
-                # Convert Price to numeric, removing any commas
-                existing_df['Price'] = pd.to_numeric(existing_df['Price'].astype(str).str.replace(',', ''), errors='coerce')
-                last_date = existing_df['Date'].max()
+            # Only the newest row is needed: new prices are appended after it
+            last_row = self._read_last_row() if self.price_file.exists() else pd.DataFrame()
+            if not last_row.empty:
+                last_date = last_row['Date'].iloc[0]
                 self.logger.info(f"Found existing data with last date: {last_date}")
             else:
                 self.logger.info("No existing price file found - starting fresh")
-                existing_df = pd.DataFrame()
+                last_row = pd.DataFrame()
                 last_date = datetime.now() - timedelta(days=30)
             
             # Calculate days to fetch
@@ -46,55 +125,65 @@ class BTCPriceCollector:
                 'interval': 'daily'
             }
             
-            response = requests.get(url, params=params)
+            response = self._session.get(url, params=params)
             response.raise_for_status()
             
             # Process new data
             data = response.json()
-            prices = data['prices']
-            
-            new_data = []
-            for timestamp_ms, price in prices:
-                date = datetime.fromtimestamp(timestamp_ms / 1000)
-                new_data.append({
-                    'Date': date.strftime('%Y-%m-%d'),
-                    'Price': float(price),  # Ensure price is float
-                    'Open': float(price),
-                    'High': float(price),
-                    'Low': float(price),
-                    'Vol.': '0',
-                    'Change %': '0'
-                })
             
-            new_df = pd.DataFrame(new_data)
-            new_df['Date'] = pd.to_datetime(new_df['Date'])
-            
-            # Combine with existing data
-            if not existing_df.empty:
-                new_df = new_df[new_df['Date'] > last_date]
-                final_df = pd.concat([existing_df, new_df])
+            # Build the frame straight from the [timestamp_ms, price] pairs
+            prices = np.asarray(data['prices'], dtype=np.float64).reshape(-1, 2)
+            price = prices[:, 1]
+            new_df = pd.DataFrame({
+                'Date': pd.to_datetime(prices[:, 0], unit='ms').normalize(),
+                'Price': price,
+                'Open': price,
+                'High': price,
+                'Low': price,
+                'Vol.': '0',
+                'Change %': '0'
+            }).sort_values('Date')
+            
+            if not last_row.empty:
+                new_df = new_df[new_df['Date'] > last_date].copy()
+                if new_df.empty:
+                    self.logger.info("No new price points to add")
+                    return
+                
+                # Seed Change % with the last stored price so only the new rows are computed
+                prices = pd.concat([last_row['Price'], new_df['Price']], ignore_index=True)
+                new_df['Change %'] = (prices.pct_change() * 100).iloc[1:].to_numpy()
+                
+                # Append in the existing file's column order
+                new_df[last_row.columns].to_csv(self.price_file, mode='a', header=False, index=False)
             else:
-                final_df = new_df
-            
-            # Ensure Price is numeric before calculation
-            final_df['Price'] = pd.to_numeric(final_df['Price'], errors='coerce')
-            
-            # Calculate Change %
-            final_df['Change %'] = final_df['Price'].pct_change() * 100
-            
-            # Sort by date
-            final_df = final_df.sort_values('Date')
+                if new_df.empty:
+                    self.logger.info("No new price points to add")
+                    return
+                
+                new_df['Change %'] = new_df['Price'].pct_change() * 100
+                
+                # Ensure directory exists
+                self.price_file.parent.mkdir(parents=True, exist_ok=True)
+                new_df.to_csv(self.price_file, index=False)
             
-            # Ensure directory exists
-            self.price_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Save to CSV
-            final_df.to_csv(self.price_file, index=False)
             self.logger.info(f"Successfully saved updated price data to {self.price_file}")
+            self._save_latest_price(new_df)
             
             # Sleep to respect rate limits
             time.sleep(1)
             
         except Exception as e:
             self.logger.error(f"Error updating price data: {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
+
+    def _read_last_row(self) -> pd.DataFrame:
+        """Read the header and last data row of the price file without parsing the history"""
+        return read_last_price_row(self.price_file)
+
+    def _save_latest_price(self, df: pd.DataFrame):
+        """Write the newest price next to the CSV so readers don't have to parse the full history"""
+        latest = df.iloc[-1]
+        with open(self.latest_price_file, 'w') as f:
+            json.dump({'date': latest['Date'].strftime('%Y-%m-%d'), 'price': float(latest['Price'])}, f)
+        self.logger.info(f"Saved latest price to {self.latest_price_file}")
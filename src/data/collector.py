@@ -4,8 +4,12 @@ from pathlib import Path
 from datetime import datetime
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import random
-from bs4 import BeautifulSoup
+import threading
+from lxml import etree, html as lxml_html
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 
 try:
@@ -14,81 +18,140 @@ except ImportError as e:
     raise ImportError("Missing credentials file. Please create src/config/credentials.py with OXYLABS_USERNAME and OXYLABS_PASSWORD") from e
 
 
+class _RateLimiter:
+    """Thread-safe limiter that hands out evenly spaced request slots"""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        """Block until this caller's slot comes up"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 class WhaleDataCollector:
+    # Seconds to wait on connect/read before giving up on a request
+    REQUEST_TIMEOUT = 10
+
+    # Combined blockchain.info request rate across all collection threads; one request
+    # per 0.8 s, the pacing the single-threaded collector always used
+    BLOCKCHAIN_REQUESTS_PER_SECOND = 1 / 0.8
+
+    # Richlist selectors, compiled once. Rows whose first <small> tag links an exchange
+    # "wallet" are excluded in the row queries themselves
+    _NOT_EXCHANGE = "[not(((.//small)[1]//a)[1][contains(., 'wallet')])]"
+    _ABTB_ROWS = etree.XPath("((//table[@class='table table-striped abtb'])[1]//tbody)[1]//tr" + _NOT_EXCHANGE)
+    _BB_ROWS = etree.XPath("(//table[@class='table table-striped bb'])[1]//tr" + _NOT_EXCHANGE)
+    _ADDRESS_HREF = etree.XPath("(.//a[@href])[1]/@href")
+    _TIMESTAMP_CELLS = etree.XPath(".//td[@class='utc hidden-tablet']")
+
+    _USER_AGENTS = (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    )
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
 
+        # Shared session so concurrent wallet fetches reuse pooled connections and
+        # back off on rate limits and transient server errors
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        # Pick the user agent once so every request on the session presents the same client
+        self._session.headers.update(self._get_headers())
+        
+        # Shared pool for fetching a wallet's result pages in parallel
+        self._io_pool = ThreadPoolExecutor(max_workers=8)
+        
+        # One limiter for every thread, so parallel fetches share the API budget
+        self._rate_limiter = _RateLimiter(self.BLOCKCHAIN_REQUESTS_PER_SECOND)
+
     def get_richlist_wallets(self, pages: int = 1) -> pd.DataFrame:
         """Fetch top Bitcoin wallet addresses from bitinfocharts"""
         df = pd.DataFrame({'btc_address': [], 'last_in': [], 'last_out': []})
+        page_frames = []
         
         for page in range(1, pages + 1):
             self.logger.info(f'Extracting richlist wallets: page {page}')
             btc_richlist_url = f'https://bitinfocharts.com/top-100-richest-bitcoin-addresses-{page}.html'
             
             try:
-                response = requests.get(btc_richlist_url, headers=self._get_headers())
-                df = pd.concat([df, self._extract_richlist_wallets(response)])
+                response = self._session.get(btc_richlist_url, timeout=self.REQUEST_TIMEOUT)
+                page_frames.append(self._extract_richlist_wallets(response))
                 time.sleep(2)  # Rate limiting
             except Exception as e:
                 self.logger.error(f"Error fetching page {page}: {str(e)}")
                 
         # Delete old richlist files before saving new one
         richlist_dir = Path("data/raw/richlist")
-        for old_file in richlist_dir.glob("richlist_*.csv"):
+        for old_file in [f for f in richlist_dir.glob("richlist_*") if f.suffix in ('.parquet', '.csv')]:
             old_file.unlink()
             self.logger.info(f"Deleted old richlist file: {old_file}")
 
-        return df
+        # Concatenate once rather than re-copying the accumulated frame per page
+        return pd.concat([df] + page_frames)
 
     def get_wallet_transactions(self, address: str) -> pd.DataFrame:
         """Fetch complete transaction history for a wallet using blockchain.info API"""
         self.logger.info(f'Fetching transactions for {address}')
         
-        transactions = []
-        offset = 0
         limit = 50  # Maximum allowed by the API
-        last_hash = None
-
-        while True:
-            try:
-                self.logger.info(f'Fetching batch at offset {offset}')
-                time.sleep(0.8)  # Rate limiting
-                
-                proxy = self._get_proxy()
-                url = f"https://blockchain.info/rawaddr/{address}?offset={offset}&limit={limit}"
-                response = requests.get(url, proxies=proxy)
-                
-                if response.status_code != 200:
-                    self.logger.error(f"API error: {response.text}")
-                    break
-                
-                data = response.json()
-                txs = data.get("txs", [])
-                
-                # Check for duplicates
-                if last_hash and any(tx["hash"] == last_hash for tx in txs):
-                    self.logger.info("Reached duplicate transactions, stopping")
-                    transactions_dict = {tx["hash"]: tx for tx in transactions + txs}
-                    transactions = list(transactions_dict.values())
-                    break
-
-                transactions.extend(txs)
-                if txs:
-                    last_hash = txs[-1]["hash"]
-
-                if len(txs) < limit:
-                    self.logger.info("All transactions received")
+        first_page = self._fetch_transactions_page(address, 0, limit)
+        if first_page is None:
+            return pd.DataFrame()
+        
+        transactions = first_page.get("txs", [])
+        n_tx = first_page.get("n_tx", len(transactions))
+        
+        if len(transactions) < limit:
+            self.logger.info("All transactions received")
+        else:
+            # The first page reports the total count, so fetch the remaining pages in parallel
+            offsets = range(limit, n_tx, limit)
+            pages = self._io_pool.map(lambda offset: self._fetch_transactions_page(address, offset, limit), offsets)
+            for page in pages:
+                if page is None:
                     break
-                
-                offset += limit
-
-            except Exception as e:
-                self.logger.error(f"Error fetching transactions: {str(e)}")
-                break
-
+                transactions.extend(page.get("txs", []))
+        
+        # New transactions can shift offsets between requests; drop repeated hashes
+        transactions = list({tx["hash"]: tx for tx in transactions}.values())
+        
         return pd.json_normalize(transactions)
 
+    def _fetch_transactions_page(self, address: str, offset: int, limit: int) -> Optional[Dict]:
+        """Fetch one page of a wallet's transactions, or None if the request failed"""
+        try:
+            self.logger.info(f'Fetching batch at offset {offset} for {address}')
+            self._rate_limiter.wait()  # Rate limiting
+            
+            proxy = self._get_proxy()
+            url = f"https://blockchain.info/rawaddr/{address}?offset={offset}&limit={limit}"
+            response = self._session.get(url, proxies=proxy, timeout=self.REQUEST_TIMEOUT)
+            
+            if response.status_code != 200:
+                self.logger.error(f"API error: {response.text}")
+                return None
+            
+            return response.json()
+        
+        except Exception as e:
+            self.logger.error(f"Error fetching transactions: {str(e)}")
+            return None
+
     # def _get_proxy(self) -> Dict[str, str]:
     #     """Get proxy configuration"""
     #     session_number = random.randint(1, 9999)
@@ -105,48 +168,31 @@ class WhaleDataCollector:
 
     def _get_headers(self) -> Dict[str, str]:
         """Get request headers"""
-        user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-            'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-        ]
-        return {"User-Agent": random.choice(user_agents)}
+        return {"User-Agent": random.choice(self._USER_AGENTS)}
 
 
     def _extract_richlist_wallets(self, response) -> pd.DataFrame:
         """Parse richlist page and extract wallet information"""
-        df = pd.DataFrame({'rank': [], 'btc_address': [], 'last_in': [], 'last_out': []})
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        # Find and parse both tables
-        table_1 = soup.find('table', class_='table table-striped abtb')
-        table_1 = table_1.find('tbody') if table_1 else None
-        table_2 = soup.find('table', class_='table table-striped bb')
+        rows = []
+        tree = lxml_html.fromstring(response.text)
         
-        wallets_soup = []
-        if table_1:
-            wallets_soup.extend(table_1.find_all('tr'))
-        if table_2:
-            wallets_soup.extend(table_2.find_all('tr'))
+        # Find and parse both tables, exchange wallets already skipped
+        wallets_html = self._ABTB_ROWS(tree) + self._BB_ROWS(tree)
             
-        for wallet in wallets_soup:
+        for wallet in wallets_html:
             try:
-                # Skip exchange wallets
-                is_exchange = wallet.find('small')
-                if is_exchange and is_exchange.find('a') and 'wallet' in is_exchange.find('a').text:
-                    continue
-                    
                 # Extract address and timestamps
-                address = wallet.find('a', href=True)
-                address = address['href'].replace('https://bitinfocharts.com/bitcoin/address/', '')
+                address = self._ADDRESS_HREF(wallet)[0]
+                address = address.replace('https://bitinfocharts.com/bitcoin/address/', '')
                 
-                timestamps = wallet.find_all('td', class_='utc hidden-tablet')
-                last_in = timestamps[1].text if timestamps[1].text else None
-                last_out = timestamps[-1].text if timestamps[-1].text else None
+                timestamps = self._TIMESTAMP_CELLS(wallet)
+                last_in = timestamps[1].text_content() or None
+                last_out = timestamps[-1].text_content() or None
                 
-                df.loc[len(df)] = [len(df) + 1, address, last_in, last_out]
+                rows.append((len(rows) + 1, address, last_in, last_out))
                 
             except Exception as e:
                 self.logger.error(f"Error parsing wallet entry: {str(e)}")
                 continue
                 
-        return df
+        return pd.DataFrame(rows, columns=['rank', 'btc_address', 'last_in', 'last_out'])
@@ -5,11 +5,43 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import logging
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from src.data.BTC_price_collector import load_price_history, read_last_price_row
+from src.data.worker_logging import init_worker_logging, worker_log_queue
+
+# Per-worker calculator, set once by the metrics pool initializer
+_worker_calculator = None
+
+
+def _init_metrics_worker(calculator, log_queue, log_level: int):
+    """Pool initializer: keep this worker's calculator and send its logs to the parent"""
+    global _worker_calculator
+    init_worker_logging(log_queue, log_level)
+    _worker_calculator = calculator
+
+
+def _compute_in_worker(wallet_address: str, df: pd.DataFrame = None) -> dict:
+    """Compute one wallet's metrics in a pool worker with the calculator from the initializer"""
+    return _worker_calculator._compute_wallet_metrics(wallet_address, df)
+
 
 class WalletMetricsCalculator:
-    def __init__(self, base_dir: str = "data"):
+    # Processed transaction columns used by the metrics
+    TRANSACTION_COLUMNS = [
+        'wallet_address', 'rank', 'timestamp', 'amount_btc', 'balance_btc',
+        'price_usd', 'transaction_type', 'portfolio_pct'
+    ]
+
+    # Bump when the checkpointed running totals or their validity check change meaning
+    CHECKPOINT_VERSION = 2
+
+    def __init__(self, base_dir: str = "data", export_csv: bool = False):
         self.base_dir = Path(base_dir)
         self.logger = logging.getLogger(__name__)
+        # Metrics are stored as parquet; optionally also write CSV copies for inspection
+        self.export_csv = export_csv
         
         # Define thresholds
         self.SIGNIFICANT_SELL_THRESHOLD = 0.01  # 1% of current balance
@@ -22,25 +54,52 @@ class WalletMetricsCalculator:
     def _load_current_btc_price(self) -> float:
         """Load current BTC price (last entry from price file)"""
         price_file = self.base_dir / "raw" / "price" / "BTC_USD_Bitfinex_Investing_com.csv"
+        latest_file = price_file.parent / "latest_price.json"
+        
+        # Prefer the collector's latest-price snapshot unless the CSV was changed after it
+        try:
+            if latest_file.exists() and latest_file.stat().st_mtime >= price_file.stat().st_mtime:
+                with open(latest_file) as f:
+                    return float(json.load(f)['price'])
+        except (OSError, KeyError, ValueError) as e:
+            self.logger.warning("Could not use %s, reading price CSV instead: %s", latest_file, e)
+        
+        # Otherwise only the last CSV row is needed; parse the full history only if that fails
+        try:
+            return float(read_last_price_row(price_file)['Price'].iloc[0])
+        except FileNotFoundError as e:
+            self.logger.error("Error loading current BTC price: %s", e)
+            return 0
+        except Exception as e:
+            self.logger.warning("Could not read the last row of %s, parsing full history: %s", price_file, e)
+        
         try:
-            df = pd.read_csv(price_file)
-            # Handle price column that might have commas
-            df['Price'] = pd.to_numeric(df['Price'].astype(str).str.replace(',', ''), errors='coerce')
-            last_price = df['Price'].iloc[-1]
+            last_price = load_price_history(price_file)['Price'].iloc[-1]
             return float(last_price)
         except (FileNotFoundError, IndexError, ValueError) as e:
-            self.logger.error(f"Error loading current BTC price: {str(e)}")
+            self.logger.error("Error loading current BTC price: %s", e)
             return 0
 
-    def calculate_wallet_metrics(self, wallet_address: str) -> dict:
-        """Calculate comprehensive metrics for a wallet"""
-        transactions_file = self.base_dir / "processed" / "transactions" / f"{wallet_address}.csv"
-        if not transactions_file.exists():
-            self.logger.warning(f"No transaction data found for {wallet_address}")
-            return {}
-            
-        df = pd.read_csv(transactions_file)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    def calculate_wallet_metrics(self, wallet_address: str, df: pd.DataFrame = None) -> dict:
+        """Calculate comprehensive metrics for a wallet, from df when given or its processed file"""
+        metrics = self._compute_wallet_metrics(wallet_address, df)
+        
+        # Save metrics
+        if metrics:
+            self._save_wallet_metrics(wallet_address, metrics)
+        
+        return metrics
+    
+    def _compute_wallet_metrics(self, wallet_address: str, df: pd.DataFrame = None) -> dict:
+        """Compute metrics for a wallet without saving them; only the wallet's own checkpoint file is written"""
+        if df is None:
+            transactions_file = self.base_dir / "processed" / "transactions" / f"{wallet_address}.parquet"
+            if not transactions_file.exists():
+                self.logger.warning("No transaction data found for %s", wallet_address)
+                return {}
+                
+            # Parquet keeps the timestamp typed, so no datetime re-parse is needed
+            df = pd.read_parquet(transactions_file, columns=self.TRANSACTION_COLUMNS)
         
         # Basic metrics
         metrics = {
@@ -54,43 +113,177 @@ class WalletMetricsCalculator:
             'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
+        # Only fold rows the checkpoint hasn't seen, then checkpoint the settled prefix
+        totals, folded = self._load_checkpoint(wallet_address, df)
+        settled = self._settled_rows(df)
+        if settled > folded:
+            totals = self._fold_transactions(totals, df.iloc[folded:settled])
+            self._save_checkpoint(wallet_address, df, settled, totals)
+            folded = settled
+        totals = self._fold_transactions(totals, df.iloc[folded:])
+        
         # Trading pattern metrics
-        pattern_metrics = self._analyze_trading_pattern(df)
+        pattern_metrics = self._analyze_trading_pattern(df, totals)
         metrics.update(pattern_metrics)
         
         # Performance metrics
-        performance_metrics = self._calculate_performance_metrics(df)
+        performance_metrics = self._calculate_performance_metrics(df, totals)
         metrics.update(performance_metrics)
         
-        # Save metrics
-        self._save_wallet_metrics(wallet_address, metrics)
-        
         return metrics
     
-    def _analyze_trading_pattern(self, df: pd.DataFrame) -> dict:
+    def _empty_totals(self) -> dict:
+        """Running totals before any transaction has been folded in"""
+        return {
+            'buy_count': 0, 'sell_count': 0,
+            'buy_volume': 0.0, 'sell_volume': 0.0,
+            'significant_sells': 0,
+            'money_in': 0.0, 'money_out': 0.0,
+            'realized_pnl': 0.0,
+            # Portfolio value count/mean/sum of squared deviations, for the volatility
+            'value_count': 0, 'value_mean': 0.0, 'value_m2': 0.0,
+            # Running peak portfolio value and deepest drawdown, NaN until a priced row is seen
+            'value_max': np.nan, 'min_drawdown': np.nan
+        }
+    
+    def _fold_transactions(self, totals: dict, df: pd.DataFrame) -> dict:
+        """Add a block of transactions to the running totals"""
+        totals = dict(totals)
+        if df.empty:
+            return totals
+        
+        # transaction_type is categorical, so these compare codes rather than strings
+        is_buy = (df['transaction_type'] == 'buy').to_numpy()
+        is_sell = (df['transaction_type'] == 'sell').to_numpy()
+        amount = df['amount_btc'].to_numpy(dtype=np.float64)
+        price = df['price_usd'].to_numpy(dtype=np.float64)
+        # NaN prices are skipped by every USD sum, as pandas' sum() would
+        usd_value = amount * price
+        
+        totals['buy_count'] += int(is_buy.sum())
+        totals['sell_count'] += int(is_sell.sum())
+        totals['buy_volume'] += float(np.nansum(np.abs(amount[is_buy])))
+        totals['sell_volume'] += float(np.nansum(np.abs(amount[is_sell])))
+        totals['significant_sells'] += int(
+            (is_sell & (df['portfolio_pct'].to_numpy(dtype=np.float64) >= self.SIGNIFICANT_SELL_THRESHOLD)).sum()
+        )
+        totals['money_in'] += float(np.nansum(np.where(is_buy, usd_value, 0.0)))
+        totals['money_out'] += float(np.nansum(np.where(is_sell, -usd_value, 0.0)))
+        totals['realized_pnl'] += float(np.nansum(np.where(is_buy | is_sell, usd_value, 0.0)))
+        
+        portfolio_values = df['balance_btc'].to_numpy(dtype=np.float64) * price
+        
+        # Merge this block's mean/M2 into the running ones (parallel variance update)
+        values = portfolio_values[~np.isnan(portfolio_values)]
+        if values.size:
+            count = totals['value_count'] + values.size
+            block_mean = values.mean()
+            delta = block_mean - totals['value_mean']
+            totals['value_m2'] += float(((values - block_mean) ** 2).sum()
+                                        + delta ** 2 * totals['value_count'] * values.size / count)
+            totals['value_mean'] += float(delta * values.size / count)
+            totals['value_count'] = count
+        
+        # Continue the expanding max from the previous peak; fmax/fmin skip NaN like pandas
+        rolling_max = np.fmax.accumulate(np.concatenate(([totals['value_max']], portfolio_values)))[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdowns = (portfolio_values - rolling_max) / rolling_max * 100
+        totals['value_max'] = float(rolling_max[-1])
+        totals['min_drawdown'] = float(np.fmin.reduce(drawdowns, initial=totals['min_drawdown']))
+        
+        return totals
+    
+    def _settled_rows(self, df: pd.DataFrame) -> int:
+        """Number of leading rows that later processing runs will not change"""
+        # The latest day is re-aggregated as transactions arrive, and trailing rows without
+        # a price get one once the price file catches up
+        priced = np.flatnonzero(df['price_usd'].iloc[:-1].notna().to_numpy())
+        return int(priced[-1]) + 1 if priced.size else 0
+    
+    def _checkpoint_file(self, wallet_address: str) -> Path:
+        return self.base_dir / "processed" / "wallet_metrics" / f"{wallet_address}.ckpt.json"
+    
+    @staticmethod
+    def _prefix_fingerprint(df: pd.DataFrame, n_rows: int) -> list:
+        """Cheap summary of the first n_rows, so revised prices or amounts invalidate a checkpoint"""
+        prefix = df.iloc[:n_rows]
+        price = prefix['price_usd'].to_numpy(dtype=np.float64)
+        return [
+            float(np.nansum(price)),
+            int(np.count_nonzero(~np.isnan(price))),
+            float(np.nansum(prefix['amount_btc'].to_numpy(dtype=np.float64))),
+            float(np.nansum(prefix['balance_btc'].to_numpy(dtype=np.float64)))
+        ]
+    
+    def _load_checkpoint(self, wallet_address: str, df: pd.DataFrame):
+        """Return (totals, rows folded) from the wallet's checkpoint, or empty totals if it doesn't match df"""
+        checkpoint_file = self._checkpoint_file(wallet_address)
+        try:
+            with open(checkpoint_file) as f:
+                checkpoint = json.load(f)
+            
+            # The checkpointed rows must still be the leading rows of the file, with the same
+            # values: reprocessing against a revised price history rewrites settled rows too
+            n_rows = checkpoint['n_rows']
+            if (checkpoint['version'] == self.CHECKPOINT_VERSION
+                    and checkpoint['significant_sell_threshold'] == self.SIGNIFICANT_SELL_THRESHOLD
+                    and 0 < n_rows <= len(df)
+                    and df['timestamp'].iat[0].isoformat() == checkpoint['first_timestamp']
+                    and df['timestamp'].iat[n_rows - 1].isoformat() == checkpoint['last_timestamp']
+                    and self._prefix_fingerprint(df, n_rows) == checkpoint['fingerprint']):
+                return checkpoint['totals'], n_rows
+            
+            self.logger.info("Checkpoint for %s no longer matches its transactions, recomputing", wallet_address)
+        except FileNotFoundError:
+            pass
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            self.logger.warning("Could not use checkpoint for %s: %s", wallet_address, e)
+        
+        return self._empty_totals(), 0
+    
+    def _save_checkpoint(self, wallet_address: str, df: pd.DataFrame, n_rows: int, totals: dict):
+        """Persist the running totals covering the first n_rows of df"""
+        checkpoint_file = self._checkpoint_file(wallet_address)
+        checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        checkpoint = {
+            'version': self.CHECKPOINT_VERSION,
+            'significant_sell_threshold': self.SIGNIFICANT_SELL_THRESHOLD,
+            'n_rows': n_rows,
+            'first_timestamp': df['timestamp'].iat[0].isoformat(),
+            'last_timestamp': df['timestamp'].iat[n_rows - 1].isoformat(),
+            'fingerprint': self._prefix_fingerprint(df, n_rows),
+            'totals': totals
+        }
+        
+        # Write then rename so an interrupted run never leaves a truncated checkpoint
+        tmp_file = checkpoint_file.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        tmp_file.replace(checkpoint_file)
+    
+    def _analyze_trading_pattern(self, df: pd.DataFrame, totals: dict) -> dict:
         """Analyze trading patterns and categorize wallet behavior"""
-        trades = df[df['transaction_type'].isin(['buy', 'sell'])]
-        buys = trades[trades['transaction_type'] == 'buy']
-        sells = trades[trades['transaction_type'] == 'sell']
+        buy_count = totals['buy_count']
+        sell_count = totals['sell_count']
         
         # Calculate trade counts and volumes
         metrics = {
-            'buy_count': len(buys),
-            'sell_count': len(sells),
-            'total_buy_volume': buys['amount_btc'].abs().sum(),
-            'total_sell_volume': sells['amount_btc'].abs().sum(),
-            'avg_buy_size': buys['amount_btc'].abs().mean() if not buys.empty else 0,
-            'avg_sell_size': sells['amount_btc'].abs().mean() if not sells.empty else 0,
+            'buy_count': buy_count,
+            'sell_count': sell_count,
+            'total_buy_volume': totals['buy_volume'],
+            'total_sell_volume': totals['sell_volume'],
+            'avg_buy_size': totals['buy_volume'] / buy_count if buy_count else 0,
+            'avg_sell_size': totals['sell_volume'] / sell_count if sell_count else 0,
         }
         
         # Calculate trading frequency (trades per month)
         date_range = (df['timestamp'].max() - df['timestamp'].min()).days / 30
-        trades_per_month = len(trades) / date_range if date_range > 0 else 0
+        trades_per_month = (buy_count + sell_count) / date_range if date_range > 0 else 0
         metrics['trades_per_month'] = trades_per_month
         
         # Analyze significant sells
-        significant_sells = sells[sells['portfolio_pct'] >= self.SIGNIFICANT_SELL_THRESHOLD]
-        metrics['significant_sells_count'] = len(significant_sells)
+        metrics['significant_sells_count'] = totals['significant_sells']
         
         # Determine trader type
         metrics['trader_type'] = self._determine_trader_type(
@@ -101,65 +294,47 @@ class WalletMetricsCalculator:
         
         return metrics
     
-    def _calculate_performance_metrics(self, df: pd.DataFrame) -> dict:
+    def _calculate_performance_metrics(self, df: pd.DataFrame, totals: dict) -> dict:
         """Calculate detailed performance metrics"""
         metrics = {}
         
-        # Get all buys and sells
-        buys = df[df['transaction_type'] == 'buy']
-        sells = df[df['transaction_type'] == 'sell']
-        
-        if not buys.empty and 'price_usd' in df.columns:
+        if totals['buy_count'] > 0:
             # Calculate net investment (money in - money out)
-            total_money_in = (buys['amount_btc'] * buys['price_usd']).sum()
-            total_money_out = (sells['amount_btc'].abs() * sells['price_usd']).sum() if not sells.empty else 0
+            total_money_in = totals['money_in']
+            total_money_out = totals['money_out']
             net_investment = total_money_in - total_money_out
             
             # Current portfolio value
             current_balance = df.iloc[-1]['balance_btc']
             current_value = current_balance * self.current_btc_price
-            wallet_address = df.iloc[0]['wallet_address'] if 'wallet_address' in df.columns else "unknown"
-            print(f"🔢 ROI DEBUG for {wallet_address}:", file=sys.stderr)
-            # DEBUG: Print the calculations
-            print(f"Total money in: ${total_money_in:,.2f}")
-            print(f"Total money out: ${total_money_out:,.2f}")
-            print(f"Net investment: ${net_investment:,.2f}")
-            print(f"Current balance: {current_balance:.8f} BTC")
-            print(f"Current BTC price: ${self.current_btc_price:,.2f}")
-            print(f"Current value: ${current_value:,.2f}")
+            self.logger.debug(
+                "ROI inputs: money_in=%.2f money_out=%.2f net=%.2f balance=%.8f price=%.2f value=%.2f",
+                total_money_in, total_money_out, net_investment,
+                current_balance, self.current_btc_price, current_value
+            )
 
             # ROI calculation
             if net_investment > 0:
                 roi = ((current_value - net_investment) / net_investment) * 100
                 metrics['roi_overall'] = roi
-                print(f"ROI OVERALL: %{roi:,.2f}")
             else:
                 metrics['roi_overall'] = 0
         else:
             metrics['roi_overall'] = 0
 
-        # Calculate realized PnL from trades
-        trades = df[df['transaction_type'].isin(['buy', 'sell'])]
-        if not trades.empty:
-            realized_pnl = trades.apply(
-                lambda x: x['amount_btc'] * x['price_usd'] if pd.notnull(x['price_usd']) else 0, 
-                axis=1
-            ).sum()
-            metrics['realized_pnl_usd'] = realized_pnl
+        # Realized PnL from trades
+        if totals['buy_count'] + totals['sell_count'] > 0:
+            metrics['realized_pnl_usd'] = totals['realized_pnl']
             
         # Calculate volatility of portfolio value
-        if 'price_usd' in df.columns:
-            portfolio_values = df['balance_btc'] * df['price_usd']
-            if len(portfolio_values) > 1 and portfolio_values.mean() > 0:
-                metrics['portfolio_value_volatility'] = portfolio_values.std() / portfolio_values.mean() * 100
+        value_count = totals['value_count']
+        if len(df) > 1 and value_count > 0 and totals['value_mean'] > 0:
+            value_std = np.sqrt(totals['value_m2'] / (value_count - 1)) if value_count > 1 else np.nan
+            metrics['portfolio_value_volatility'] = value_std / totals['value_mean'] * 100
             
         # Calculate max drawdown
-        if 'price_usd' in df.columns:
-            portfolio_values = df['balance_btc'] * df['price_usd']
-            if len(portfolio_values) > 1:
-                rolling_max = portfolio_values.expanding().max()
-                drawdowns = (portfolio_values - rolling_max) / rolling_max * 100
-                metrics['max_drawdown_pct'] = abs(drawdowns.min())
+        if len(df) > 1:
+            metrics['max_drawdown_pct'] = abs(totals['min_drawdown'])
         
         return metrics
     
@@ -177,32 +352,79 @@ class WalletMetricsCalculator:
             return 'Holder'
     
     def _save_wallet_metrics(self, wallet_address: str, metrics: dict):
-        """Save metrics to a CSV file"""
+        """Save metrics to the wallet's file and the summary"""
+        self._save_wallet_file(wallet_address, metrics)
+        self._update_summary([metrics])
+    
+    def _save_wallet_file(self, wallet_address: str, metrics: dict):
+        """Save individual wallet metrics"""
         output_dir = self.base_dir / "processed" / "wallet_metrics"
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Save individual wallet metrics
-        wallet_file = output_dir / f"{wallet_address}.csv"
-        pd.DataFrame([metrics]).to_csv(wallet_file, index=False)
+        wallet_df = pd.DataFrame([metrics])
+        wallet_df.to_parquet(output_dir / f"{wallet_address}.parquet", engine='pyarrow', compression='zstd', index=False)
+        if self.export_csv:
+            wallet_df.to_csv(output_dir / f"{wallet_address}.csv", index=False)
+    
+    def _update_summary(self, metrics_list: list):
+        """Replace or append the given wallets' rows in the summary file with a single rewrite"""
+        output_dir = self.base_dir / "processed" / "wallet_metrics"
+        output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Update or append to summary file
-        summary_file = output_dir / "all_wallets_summary.csv"
+        summary_file = output_dir / "all_wallets_summary.parquet"
+        legacy_file = output_dir / "all_wallets_summary.csv"
+        new_rows = pd.DataFrame(metrics_list)
         if summary_file.exists():
-            summary_df = pd.read_csv(summary_file)
-            summary_df = summary_df[summary_df['wallet_address'] != wallet_address]
-            summary_df = pd.concat([summary_df, pd.DataFrame([metrics])], ignore_index=True)
+            summary_df = pd.read_parquet(summary_file)
+        elif legacy_file.exists():
+            # Summary written before the switch to parquet storage
+            summary_df = pd.read_csv(legacy_file)
+        else:
+            summary_df = None
+        
+        if summary_df is not None:
+            summary_df = summary_df[~summary_df['wallet_address'].isin(new_rows['wallet_address'])]
+            summary_df = pd.concat([summary_df, new_rows], ignore_index=True)
         else:
-            summary_df = pd.DataFrame([metrics])
+            summary_df = new_rows
             
-        summary_df.to_csv(summary_file, index=False)
+        summary_df.to_parquet(summary_file, engine='pyarrow', compression='zstd', index=False)
+        if self.export_csv:
+            summary_df.to_csv(legacy_file, index=False)
         
-    def process_all_wallets(self):
+    def process_all_wallets(self, processed_frames: dict = None):
         """Process metrics for all wallets with transaction data"""
         transaction_dir = self.base_dir / "processed" / "transactions"
-        for file in transaction_dir.glob("*.csv"):
-            wallet_address = file.stem
-            try:
-                self.calculate_wallet_metrics(wallet_address)
-                self.logger.info(f"Processed metrics for {wallet_address}")
-            except Exception as e:
-                self.logger.error(f"Error processing metrics for {wallet_address}: {str(e)}")
\ No newline at end of file
+        wallet_addresses = [file.stem for file in transaction_dir.glob("*.parquet")]
+        # Frames DataProcessor just wrote (by address) are used in place of re-reading their files;
+        # they still travel to the workers pickled with each task, projected to the needed columns
+        processed_frames = processed_frames or {}
+        
+        # Wallets are independent: compute them across cores, save from this process.
+        # The calculator reaches each worker once through the initializer, and worker logs
+        # are written by this process's handlers
+        processed_metrics = []
+        with worker_log_queue() as log_queue, ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            initializer=_init_metrics_worker,
+            initargs=(self, log_queue, logging.getLogger().getEffectiveLevel())
+        ) as executor:
+            futures = {}
+            for wallet_address in wallet_addresses:
+                df = processed_frames.get(wallet_address)
+                if df is not None:
+                    df = df[self.TRANSACTION_COLUMNS].reset_index(drop=True)
+                futures[wallet_address] = executor.submit(_compute_in_worker, wallet_address, df)
+            for wallet_address, future in futures.items():
+                try:
+                    metrics = future.result()
+                    if metrics:
+                        self._save_wallet_file(wallet_address, metrics)
+                        processed_metrics.append(metrics)
+                    self.logger.info("Processed metrics for %s", wallet_address)
+                except Exception as e:
+                    self.logger.error("Error processing metrics for %s: %s", wallet_address, e)
+        
+        # Rewrite the summary once for the whole run instead of once per wallet
+        if processed_metrics:
+            self._update_summary(processed_metrics)
@@ -1,202 +1,268 @@
 from pathlib import Path
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 from datetime import datetime
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from src.data.BTC_price_collector import load_price_history
+from src.data.worker_logging import init_worker_logging, worker_log_queue
+
+# Per-worker processor, set once by the processing pool initializer
+_worker_processor = None
+
+
+def _init_processing_worker(processor, log_queue, log_level: int):
+    """Pool initializer: keep this worker's processor and send its logs to the parent"""
+    global _worker_processor
+    init_worker_logging(log_queue, log_level)
+    _worker_processor = processor
+
+
+def _process_in_worker(wallet_address: str, df: pd.DataFrame = None) -> pd.DataFrame:
+    """Process one wallet in a pool worker with the processor from the initializer"""
+    return _worker_processor.process_wallet_transactions(wallet_address, df)
+
 
 class DataProcessor:
+    # Raw transaction fields read by the processor
+    RAW_COLUMNS = ['time', 'hash', 'result', 'balance', 'fee', 'block_height']
+    # Always-present integer fields of legacy CSVs; fee and block_height can be blank and stay inferred
+    RAW_CSV_DTYPES = {'hash': str, 'time': 'int64', 'result': 'int64', 'balance': 'int64'}
+
+    # Compact dtypes for the processed files; parquet keeps them for every reader.
+    # Fixed transaction types keep the categories identical across wallets, so concatenated
+    # frames stay categorical. BTC amounts stay float64: float32 can't hold satoshi precision
+    TRANSACTION_TYPE_DTYPE = pd.CategoricalDtype(['buy', 'sell', 'transfer'])
+    TX_DTYPES = {'wallet_address': 'category', 'transaction_type': TRANSACTION_TYPE_DTYPE}
+
     def __init__(self, base_dir: str = "data"):
         self.base_dir = Path(base_dir)
         self.logger = logging.getLogger(__name__)
         self.price_data = self._load_price_data()
+        # One price per calendar day; the price file can repeat a date and the first entry wins
+        self.daily_prices = self.price_data.loc[~self.price_data.index.duplicated(keep='first'), 'Price']
         self.richlist = self._load_richlist()
+        # Wallet address -> richlist rank; the first listing wins, as with the old row scan
+        self._rank_by_address = (
+            {} if self.richlist.empty
+            else dict(zip(self.richlist['btc_address'][::-1], self.richlist['rank'][::-1]))
+        )
 
     def _load_richlist(self) -> pd.DataFrame:
         """Load latest richlist data"""
         richlist_dir = self.base_dir / "raw" / "richlist"
         
         # First check if directory exists
-        if not richlist_dir.exists():
-            self.logger.warning(f"Richlist directory not found: {richlist_dir}")
+        if not richlist_dir.is_dir():
+            self.logger.warning("Richlist directory not found: %s", richlist_dir)
             return pd.DataFrame()
         
         # Get list of files and log what we found
-        files = list(richlist_dir.glob("richlist_*.csv"))
-        self.logger.info(f"Found richlist files: {[f.name for f in files]}")
+        with os.scandir(richlist_dir) as entries:
+            files = [
+                entry.name for entry in entries
+                if entry.is_file(follow_symlinks=False)
+                and entry.name.startswith('richlist_') and entry.name.endswith(('.parquet', '.csv'))
+            ]
+        self.logger.info("Found richlist files: %s", files)
         
         if not files:
             self.logger.warning("No richlist files found")
             return pd.DataFrame()
             
-        # Get latest file by comparing date in filename
-        latest_file = max(files, key=lambda x: x.stem.split('_')[1])
-        self.logger.info(f"Using latest richlist file: {latest_file}")
+        # Get latest file by comparing the YYYYMMDD date in richlist_YYYYMMDD.<ext>
+        # Parquet over a legacy CSV from the same day
+        latest_file = richlist_dir / max(files, key=lambda name: (name[9:17], name.endswith('.parquet')))
+        self.logger.info("Using latest richlist file: %s", latest_file)
         
         try:
-            df = pd.read_csv(latest_file)
-            self.logger.info(f"Loaded richlist with {len(df)} rows")
+            if latest_file.suffix == '.parquet':
+                df = pd.read_parquet(latest_file)
+            else:
+                df = pd.read_csv(latest_file)
+            self.logger.info("Loaded richlist with %d rows", len(df))
             return df
         except Exception as e:
-            self.logger.error(f"Error loading richlist file: {str(e)}")
+            self.logger.error("Error loading richlist file: %s", e)
             return pd.DataFrame()
     
     def _load_price_data(self) -> pd.DataFrame:
         """Load BTC-USD price data"""
         price_file = self.base_dir / "raw" / "price" / "BTC_USD_Bitfinex_Investing_com.csv"
         try:
-            df = pd.read_csv(price_file)
-            df['Date'] = pd.to_datetime(df['Date'])
-            # Convert price to numeric, removing any commas
-            df['Price'] = pd.to_numeric(df['Price'].astype(str).str.replace(',', ''), errors='coerce')
-            return df.set_index('Date')
+            return load_price_history(price_file).set_index('Date')
         except FileNotFoundError:
-            self.logger.error(f"Price data file not found at {price_file}")
+            self.logger.error("Price data file not found at %s", price_file)
             raise
             
-    def process_wallet_transactions(self, wallet_address: str) -> pd.DataFrame:
-        """Process raw transaction data for a wallet"""
-        raw_file = self.base_dir / "raw" / "transactions" / f"{wallet_address}.csv"
-        if not raw_file.exists():
-            self.logger.warning(f"No data found for wallet {wallet_address}")
-            return pd.DataFrame()
+    def process_wallet_transactions(self, wallet_address: str, df: pd.DataFrame = None) -> pd.DataFrame:
+        """Process raw transaction data for a wallet, from df when given or its raw file"""
+        if df is None:
+            df = self._read_raw_transactions(wallet_address)
+            if df is None:
+                self.logger.warning("No data found for wallet %s", wallet_address)
+                return pd.DataFrame()
         
-        df = pd.read_csv(raw_file)
+        # Scale every satoshi column to BTC in one in-place pass over a single float64 block.
+        # Division rather than * 1e-8 keeps the values bit-identical to per-column scaling
+        satoshi_columns = ['result', 'balance'] + (['fee'] if 'fee' in df.columns else [])
+        btc = df[satoshi_columns].to_numpy(dtype=np.float64)
+        btc /= 100000000
         
-        if not self.richlist.empty:
-            matching_rows = self.richlist[self.richlist['btc_address'] == wallet_address]
-            # self.logger.info(f"Found {len(matching_rows)} matching rows in richlist for {wallet_address}")
-            if not matching_rows.empty:
-                wallet_rank = matching_rows['rank'].iloc[0]
-                # self.logger.info(f"Found rank {wallet_rank} for wallet {wallet_address}")
-            else:
-                self.logger.warning(f"No rank found for wallet {wallet_address} in richlist")
-        else: self.logger.warning("Richlist is empty")
-
-        # Process into standardized format with last_updated timestamp
+        # Process into standardized format; columns reference their sources instead of copying,
+        # and last_updated is added once per daily row after aggregation
         processed = pd.DataFrame({
-            'wallet_address': wallet_address,
+            'wallet_address': pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), [wallet_address]),
             'timestamp': pd.to_datetime(df['time'], unit='s'),
             'hash': df['hash'],
-            'amount_btc': df['result'] / 100000000,
-            'balance_btc': df['balance'] / 100000000,
-            'fee': df['fee'] / 100000000 if 'fee' in df.columns else None,
-            'block_height': df['block_height'],
-            'last_updated': datetime.now()
-        })
+            'amount_btc': btc[:, 0],
+            'balance_btc': btc[:, 1],
+            'fee': btc[:, 2] if 'fee' in df.columns else None,
+            'block_height': df['block_height']
+        }, copy=False)
 
-        # Add wallet ranking according to richlist, Make more efficient
-        if not self.richlist.empty:
-            matching_rows = self.richlist[self.richlist['btc_address'] == wallet_address]
-            if not matching_rows.empty:
-                processed['rank'] = matching_rows['rank'].iloc[0]
-            else:
-                processed['rank'] = 999  # Former richlist wallet, now >100
-                self.logger.warning(f"Wallet {wallet_address} not in current richlist, assigning rank 999")
-        else:
+        # Add wallet ranking according to richlist
+        if not self._rank_by_address:
             processed['rank'] = 999
             self.logger.warning("Richlist is empty, assigning default rank 999")
+        elif wallet_address in self._rank_by_address:
+            processed['rank'] = self._rank_by_address[wallet_address]
+        else:
+            processed['rank'] = 999  # Former richlist wallet, now >100
+            self.logger.warning("Wallet %s not in current richlist, assigning rank 999", wallet_address)
         
-        # Match with price data and ensure numeric type
-        processed['price_usd'] = None  
-        for idx, row in processed.iterrows():
-            date = row['timestamp'].strftime('%Y-%m-%d')
-            if date in self.price_data.index:
-                price_values = self.price_data.loc[date, 'Price']
-                # Handle multiple entries for same date - take the first one
-                if isinstance(price_values, pd.Series):
-                    processed.at[idx, 'price_usd'] = float(price_values.iloc[0])
-                else:
-                    processed.at[idx, 'price_usd'] = float(price_values)
-        
-        # Calculate additional metrics with error handling
-        processed['transaction_value_usd'] = processed.apply(
-            lambda row: float(row['amount_btc']) * float(row['price_usd']) 
-            if pd.notnull(row['amount_btc']) and pd.notnull(row['price_usd']) 
-            else None, axis=1
-        )
+        # Calendar day as a midnight timestamp: int64-backed key for both the price lookup and
+        # the daily aggregation, rather than Python date objects
+        processed['date'] = processed['timestamp'].dt.normalize()
         
-        processed['transaction_type'] = processed['amount_btc'].apply(
-            lambda x: 'buy' if x > 0 else 'sell' if x < 0 else 'transfer'
-        )
+        # Match with price data by calendar day in one vectorized lookup
+        processed['price_usd'] = processed['date'].map(self.daily_prices).astype('float64')
         
-        # Calculate portfolio percentage with error handling
-        processed['portfolio_pct'] = processed.apply(
-            lambda row: (abs(float(row['amount_btc'])) / float(row['balance_btc'])) * 100 
-            if pd.notnull(row['amount_btc']) and pd.notnull(row['balance_btc']) and row['balance_btc'] != 0
-            else None, axis=1
+        # Per-transaction USD value, summed per day below; NaN prices propagate instead of raising.
+        # Transaction type and portfolio % only exist at the daily level, after aggregation
+        processed['transaction_value_usd'] = (
+            processed['amount_btc'].to_numpy(dtype=np.float64) * processed['price_usd'].to_numpy(dtype=np.float64)
         )
         
-        # Sort by timestamp
+        # Sort by timestamp; the first/last daily aggregations rely on chronological order
         processed = processed.sort_values('timestamp')
         
         # Log basic info
-        self.logger.info(f"Processed {len(processed)} transactions for {wallet_address}")
+        self.logger.info("Processed %d transactions for %s", len(processed), wallet_address)
         
-        # Add date-based aggregation
-        processed['date'] = processed['timestamp'].dt.date
-
         # Aggregate transactions by date
         # July 16th 2025 - removed , 'rank' due to keyerror (float?)
         # processed['rank'] = processed['rank'].fillna(0)
-        daily_aggregated = processed.groupby(['wallet_address', 'date', 'rank']).agg({
-            'timestamp': ['first', 'last'],
-            'hash': lambda x: ','.join(x),
-            'amount_btc': 'sum',
-            'balance_btc': 'last',
-            'fee': 'sum',
-            'block_height': ['first', 'last'],
-            'last_updated': 'max',
-            'price_usd': 'mean',
-            'transaction_value_usd': 'sum'
-        }).reset_index()
-
-        # Flatten multi-level columns
-        daily_aggregated.columns = [
-            'wallet_address', 'date', 'rank',
-            'first_timestamp', 'last_timestamp',
-            'transactions', 'amount_btc', 'balance_btc',
-            'total_fee', 'first_block', 'last_block',
-            'last_updated', 'price_usd', 'transaction_value_usd'
-        ]
-        
-        # Recalculate transaction type based on net daily movement
-        daily_aggregated['transaction_type'] = daily_aggregated['amount_btc'].apply(
-            lambda x: 'buy' if x > 0 else 'sell' if x < 0 else 'transfer'
+        # Named aggregations stay on the built-in reducers; hashes are joined by summing
+        # comma-terminated strings instead of calling a Python lambda per group
+        group_keys = ['wallet_address', 'date', 'rank']
+        daily_aggregated = processed.groupby(group_keys, observed=True).agg(
+            first_timestamp=('timestamp', 'first'),
+            last_timestamp=('timestamp', 'last'),
+            amount_btc=('amount_btc', 'sum'),
+            balance_btc=('balance_btc', 'last'),
+            total_fee=('fee', 'sum'),
+            first_block=('block_height', 'first'),
+            last_block=('block_height', 'last'),
+            price_usd=('price_usd', 'mean'),
+            transaction_value_usd=('transaction_value_usd', 'sum')
         )
+        hashes = (processed['hash'] + ',').groupby([processed[key] for key in group_keys], observed=True).sum()
+        daily_aggregated.insert(2, 'transactions', hashes.str[:-1])
+        daily_aggregated.insert(daily_aggregated.columns.get_loc('price_usd'), 'last_updated', datetime.now())
+        daily_aggregated = daily_aggregated.reset_index()
         
-        # Recalculate portfolio percentage based on net daily movement
-        daily_aggregated['portfolio_pct'] = daily_aggregated.apply(
-            lambda row: (abs(float(row['amount_btc'])) / float(row['balance_btc'])) * 100 
-            if pd.notnull(row['amount_btc']) and pd.notnull(row['balance_btc']) and row['balance_btc'] != 0
-            else None, axis=1
+        # Recalculate transaction type and portfolio percentage based on net daily movement
+        daily_amount = daily_aggregated['amount_btc'].to_numpy(dtype=np.float64)
+        daily_aggregated['transaction_type'] = self._transaction_types(daily_amount)
+        daily_aggregated['portfolio_pct'] = self._portfolio_pct(
+            daily_amount, daily_aggregated['balance_btc'].to_numpy(dtype=np.float64)
         )
         
-        # Convert date back to timestamp for consistency
-        daily_aggregated['timestamp'] = pd.to_datetime(daily_aggregated['date'])
-        daily_aggregated = daily_aggregated.drop('date', axis=1)
-        
-        # Sort by timestamp
-        daily_aggregated = daily_aggregated.sort_values('timestamp')
+        # The date key is already a midnight timestamp
+        # Groupby emits its keys sorted, so the daily rows are already in timestamp order
+        daily_aggregated['timestamp'] = daily_aggregated.pop('date')
         
         # Add log for aggregation results
-        self.logger.info(f"Consolidated into {len(daily_aggregated)} daily records for {wallet_address}")
+        self.logger.info("Consolidated into %d daily records for %s", len(daily_aggregated), wallet_address)
+        
+        daily_aggregated = daily_aggregated.astype(self.TX_DTYPES)
         
         # Save processed data
-        output_file = self.base_dir / "processed" / "transactions" / f"{wallet_address}.csv"
+        output_file = self.base_dir / "processed" / "transactions" / f"{wallet_address}.parquet"
         output_file.parent.mkdir(parents=True, exist_ok=True)
-        daily_aggregated.to_csv(output_file, index=False)
+        daily_aggregated.to_parquet(output_file, engine='pyarrow', compression='zstd', index=False)
         
         return daily_aggregated
 
-    def process_all_wallets(self):
-        """Process all wallets in raw data"""
+    def _read_raw_transactions(self, wallet_address: str) -> pd.DataFrame:
+        """Read the raw fields of a wallet's collected transactions, or None if it has no file"""
         raw_dir = self.base_dir / "raw" / "transactions"
-        for file in raw_dir.glob("*.csv"):
-            wallet_address = file.stem
-            self.logger.info(f"\nProcessing wallet: {wallet_address}")
-            try:
-                self.process_wallet_transactions(wallet_address)
-            except Exception as e:
-                self.logger.error(f"Error processing wallet {wallet_address}: {e}")
-                self.logger.exception("Full error trace:")
-                continue
\ No newline at end of file
+        raw_file = raw_dir / f"{wallet_address}.parquet"
+        legacy_file = raw_dir / f"{wallet_address}.csv"
+        if raw_file.exists():
+            # Skip the nested inputs/outputs; 'fee' may be absent from older collections
+            schema_columns = set(pq.read_schema(raw_file).names)
+            return pd.read_parquet(raw_file, columns=[c for c in self.RAW_COLUMNS if c in schema_columns])
+        if legacy_file.exists():
+            # Collected before the switch to parquet storage
+            return pd.read_csv(legacy_file, usecols=lambda column: column in self.RAW_COLUMNS,
+                               dtype=self.RAW_CSV_DTYPES)
+        return None
+
+    @staticmethod
+    def _transaction_types(amount: np.ndarray) -> np.ndarray:
+        """'buy' for inflows, 'sell' for outflows, 'transfer' for zero or missing amounts"""
+        return np.select([amount > 0, amount < 0], ['buy', 'sell'], default='transfer')
+
+    @staticmethod
+    def _portfolio_pct(amount: np.ndarray, balance: np.ndarray) -> np.ndarray:
+        """Amount moved as a percentage of the balance, NaN where the balance is zero or missing"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(balance != 0, np.abs(amount) / balance * 100, np.nan)
+
+    def process_all_wallets(self, raw_frames: dict = None) -> dict:
+        """Process all wallets in raw data, returning the processed frames by wallet address"""
+        raw_dir = self.base_dir / "raw" / "transactions"
+        if not raw_dir.is_dir():
+            self.logger.warning("Raw transactions directory not found: %s", raw_dir)
+            return {}
+        
+        with os.scandir(raw_dir) as entries:
+            wallet_addresses = sorted({
+                os.path.splitext(entry.name)[0] for entry in entries
+                if entry.is_file(follow_symlinks=False) and entry.name.endswith(('.parquet', '.csv'))
+            })
+        # Frames the collector just saved (by address) are used in place of re-reading their files;
+        # they still travel to the workers pickled with each task, projected to the raw columns
+        raw_frames = raw_frames or {}
+        processed_frames = {}
+        
+        # Wallets are independent files: process them across cores, collect frames here.
+        # The processor (prices, ranks) reaches each worker once through the initializer,
+        # and worker logs are written by this process's handlers
+        with worker_log_queue() as log_queue, ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            initializer=_init_processing_worker,
+            initargs=(self, log_queue, logging.getLogger().getEffectiveLevel())
+        ) as executor:
+            futures = {}
+            for wallet_address in wallet_addresses:
+                df = raw_frames.get(wallet_address)
+                if df is not None:
+                    df = df[[c for c in self.RAW_COLUMNS if c in df.columns]]
+                futures[wallet_address] = executor.submit(_process_in_worker, wallet_address, df)
+            for wallet_address, future in futures.items():
+                self.logger.info("\nProcessing wallet: %s", wallet_address)
+                try:
+                    processed = future.result()
+                    if not processed.empty:
+                        processed_frames[wallet_address] = processed
+                except Exception as e:
+                    self.logger.error("Error processing wallet %s: %s", wallet_address, e)
+                    self.logger.exception("Full error trace:")
+                    continue
+        
+        return processed_frames
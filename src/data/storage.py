@@ -22,10 +22,10 @@ class DataStorage:
     def save_richlist(self, data: pd.DataFrame):
         """Save richlist data"""
         timestamp = datetime.now().strftime('%Y%m%d')
-        filename = f"richlist_{timestamp}.csv"
+        filename = f"richlist_{timestamp}.parquet"
         filepath = self.base_dir / "raw" / "richlist" / filename
         
-        data.to_csv(filepath, index=False)
+        data.to_parquet(filepath, engine='pyarrow', compression='zstd', index=False)
         self.logger.info(f"Saved richlist to {filepath}")
 
     def save_wallet_transactions(self, address: str, data: pd.DataFrame):
@@ -34,28 +34,31 @@ class DataStorage:
             self.logger.warning(f"No transactions to save for {address}")
             return
             
-        filename = f"{address}.csv"
+        filename = f"{address}.parquet"
         filepath = self.base_dir / "raw" / "transactions" / filename
         
-        data.to_csv(filepath, index=False)
+        data.to_parquet(filepath, engine='pyarrow', compression='zstd', index=False)
         self.logger.info(f"Saved {len(data)} transactions for {address} to {filepath}")
 
     def get_wallet_transactions(self, address: str) -> pd.DataFrame:
         """Load wallet transactions"""
-        filepath = self.base_dir / "raw" / "transactions" / f"{address}.csv"
+        filepath = self.base_dir / "raw" / "transactions" / f"{address}.parquet"
         
         if not filepath.exists():
             return pd.DataFrame()
             
-        return pd.read_csv(filepath)
+        return pd.read_parquet(filepath)
 
     def get_latest_richlist(self) -> pd.DataFrame:
         """Get most recent richlist data"""
         richlist_dir = self.base_dir / "raw" / "richlist"
-        files = list(richlist_dir.glob("richlist_*.csv"))
+        files = [f for f in richlist_dir.glob("richlist_*") if f.suffix in ('.parquet', '.csv')]
         
         if not files:
             return pd.DataFrame()
             
-        latest_file = max(files, key=lambda x: x.stem.split('_')[1])
+        # Latest YYYYMMDD from richlist_YYYYMMDD.<ext> wins; parquet over a legacy CSV from the same day
+        latest_file = max(files, key=lambda x: (x.name[9:17], x.suffix == '.parquet'))
+        if latest_file.suffix == '.parquet':
+            return pd.read_parquet(latest_file)
         return pd.read_csv(latest_file)
\ No newline at end of file
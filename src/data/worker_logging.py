@@ -0,0 +1,31 @@
+import logging
+import logging.handlers
+import multiprocessing
+from contextlib import contextmanager
+
+
+def init_worker_logging(log_queue, log_level: int):
+    """Replace the handlers a pool worker inherited with a queue back to the parent process"""
+    root_logger = logging.getLogger()
+    # Forked workers inherit the parent's handler objects; writing through them duplicates
+    # or loses records, so only the parent's listener writes to files and streams
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(log_level)
+
+
+@contextmanager
+def worker_log_queue():
+    """Queue for pool workers' log records, written by the parent's root handlers while open"""
+    root_logger = logging.getLogger()
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        yield log_queue
+    finally:
+        # Stopping drains every record queued before the pool shut down
+        listener.stop()
+        log_queue.close()
+        log_queue.join_thread()
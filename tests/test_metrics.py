@@ -0,0 +1,126 @@
+import unittest
+import tempfile
+import logging
+import math
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.data.metrics import WalletMetricsCalculator
+
+class TestIncrementalMetrics(unittest.TestCase):
+    """Tests for checkpointed, incremental wallet metrics"""
+
+    def setUp(self):
+        logging.getLogger().setLevel(logging.ERROR)  # Reduce noise during tests
+        self.wallet_address = "bc1qtestwallet0000000000000000000000000000"
+        self._dirs = [tempfile.TemporaryDirectory() for _ in range(2)]
+        self.checkpointed_dir, self.fresh_dir = (Path(d.name) for d in self._dirs)
+        for base_dir in (self.checkpointed_dir, self.fresh_dir):
+            self._write_price_file(base_dir)
+        self.transactions = self._make_transactions(200)
+
+    def tearDown(self):
+        for d in self._dirs:
+            d.cleanup()
+
+    def _write_price_file(self, base_dir: Path):
+        """Minimal price history so the calculator has a current BTC price"""
+        price_dir = base_dir / "raw" / "price"
+        price_dir.mkdir(parents=True)
+        pd.DataFrame({
+            'Date': ['2024-01-01', '2024-01-02'],
+            'Price': [42000.0, 43000.0],
+            'Open': [42000.0, 42000.0], 'High': [43000.0, 43000.0], 'Low': [41000.0, 41000.0],
+            'Vol.': [None, None], 'Change %': [None, 2.38]
+        }).to_csv(price_dir / "BTC_USD_Bitfinex_Investing_com.csv", index=False)
+
+    def _make_transactions(self, n: int) -> pd.DataFrame:
+        """Daily processed transactions with buys, sells, transfers and a few missing prices"""
+        rng = np.random.default_rng(7)
+        amount = np.round(rng.normal(0, 50, n), 8)
+        amount[::17] = 0.0
+        balance = 1000 + np.cumsum(np.abs(amount))
+        price = rng.uniform(20000, 60000, n)
+        price[[5, 60, 61, 120]] = np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            portfolio_pct = np.where(balance != 0, np.abs(amount) / balance * 100, np.nan)
+        return pd.DataFrame({
+            'wallet_address': pd.Categorical([self.wallet_address] * n),
+            'rank': 1.0,
+            'timestamp': pd.date_range('2023-01-01', periods=n, freq='D'),
+            'amount_btc': amount,
+            'balance_btc': balance,
+            'price_usd': price,
+            'transaction_type': pd.Categorical(
+                np.select([amount > 0, amount < 0], ['buy', 'sell'], default='transfer'),
+                categories=['buy', 'sell', 'transfer']
+            ),
+            'portfolio_pct': portfolio_pct
+        })
+
+    def assert_metrics_equal(self, actual: dict, expected: dict):
+        """Compare metric dicts, numeric values to a relative 1e-9"""
+        self.assertEqual(set(actual), set(expected))
+        for key, value in expected.items():
+            if key == 'last_updated':
+                continue
+            if isinstance(value, (float, np.floating)):
+                if math.isnan(value):
+                    self.assertTrue(math.isnan(actual[key]), key)
+                else:
+                    self.assertTrue(math.isclose(actual[key], value, rel_tol=1e-9), f"{key}: {actual[key]} != {value}")
+            else:
+                self.assertEqual(actual[key], value, key)
+
+    def test_checkpointed_run_matches_full_recompute(self):
+        """A run folding appended transactions onto a checkpoint matches computing from scratch"""
+        calculator = WalletMetricsCalculator(base_dir=str(self.checkpointed_dir))
+
+        # First run sees only the older transactions and checkpoints them
+        calculator._compute_wallet_metrics(self.wallet_address, self.transactions.iloc[:150].reset_index(drop=True))
+        self.assertTrue(calculator._checkpoint_file(self.wallet_address).exists())
+
+        # Second run over the appended history resumes from the checkpoint
+        _, folded = calculator._load_checkpoint(self.wallet_address, self.transactions)
+        self.assertGreater(folded, 0)
+        incremental = calculator._compute_wallet_metrics(self.wallet_address, self.transactions)
+
+        full = WalletMetricsCalculator(base_dir=str(self.fresh_dir))._compute_wallet_metrics(
+            self.wallet_address, self.transactions
+        )
+        self.assert_metrics_equal(incremental, full)
+
+    def test_mismatched_checkpoint_is_ignored(self):
+        """A checkpoint whose rows no longer lead the transactions is not reused"""
+        calculator = WalletMetricsCalculator(base_dir=str(self.checkpointed_dir))
+        calculator._compute_wallet_metrics(self.wallet_address, self.transactions.iloc[:150].reset_index(drop=True))
+
+        # Older history that appeared later shifts the leading rows
+        rewritten = self.transactions.copy()
+        rewritten['timestamp'] = rewritten['timestamp'] - pd.Timedelta(days=1)
+        _, folded = calculator._load_checkpoint(self.wallet_address, rewritten)
+        self.assertEqual(folded, 0)
+
+        full = WalletMetricsCalculator(base_dir=str(self.fresh_dir))._compute_wallet_metrics(
+            self.wallet_address, rewritten
+        )
+        self.assert_metrics_equal(calculator._compute_wallet_metrics(self.wallet_address, rewritten), full)
+
+    def test_revised_prefix_price_invalidates_checkpoint(self):
+        """Checkpointed totals are not reused once a settled row's price changes"""
+        calculator = WalletMetricsCalculator(base_dir=str(self.checkpointed_dir))
+        calculator._compute_wallet_metrics(self.wallet_address, self.transactions.iloc[:150].reset_index(drop=True))
+
+        # Reprocessing against a revised price history rewrites a row inside the checkpointed prefix
+        revised = self.transactions.copy()
+        revised.loc[10, 'price_usd'] *= 1.5
+        _, folded = calculator._load_checkpoint(self.wallet_address, revised)
+        self.assertEqual(folded, 0)
+
+        full = WalletMetricsCalculator(base_dir=str(self.fresh_dir))._compute_wallet_metrics(
+            self.wallet_address, revised
+        )
+        self.assert_metrics_equal(calculator._compute_wallet_metrics(self.wallet_address, revised), full)
+
+if __name__ == '__main__':
+    unittest.main()